@@ -8,8 +8,29 @@ Created on Fri Sep 26 15:47:27 2025
 import pandas as pd
 import glob
 import os
+import sys
 
-def global_min_max():
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+if REPO_ROOT not in sys.path: #run from this folder, the package lives two levels up
+    sys.path.append(REPO_ROOT)
+from marshall_analysis import cube
+
+CUBE_SEGMENTS = os.path.join(REPO_ROOT, "Reports", "BlockA_cube_segments.csv")
+
+def global_min_max(cube_path=CUBE_SEGMENTS):
+    """
+    Min/max of each control column, per segment and overall.
+    The tables come from the summary cube's segment table (see cube.py) when
+    it has been written, otherwise every CSV in the current folder is read.
+    """
+    os.makedirs("minmax", exist_ok=True)
+    if cube_path is not None and os.path.exists(cube_path):
+        print(f"Reading min/max from {cube_path}")
+        df_min, df_max, global_min, global_max = cube.min_max_tables(cube.load_segments(cube_path))
+        df_min.to_csv("minmax/local_mins.csv", index=False)
+        df_max.to_csv("minmax/local_maxs.csv", index=False)
+        return global_min, global_max
+    
     mins=[]
     maxs=[]
     # Find all CSV files in current folder
@@ -53,4 +74,4 @@ if __name__ == "__main__":
         for col in gmin.index:
             print(f"{col}: min = {gmin[col]}, max = {gmax[col]}")
             
-global_min_max()
\ No newline at end of file
+global_min_max()
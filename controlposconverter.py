@@ -8,13 +8,12 @@ Created on Tue Oct 26 13:37:09 2025
 
 import pandas as pd
 import numpy as np
-import plotly.io as pio
-from plotly.subplots import make_subplots
-import plotly.graph_objects as go
 import random
-import math
+import os
+import re
 
-pio.renderers.default='browser'
+from marshall_analysis import convert_data, extract_pilot_id, get_active_maneuvers
+from marshall_analysis import batch, filters, quality, slicing, zeroref
 
 
 def read_csv(filename):
@@ -29,65 +28,34 @@ def read_csv(filename):
     except FileNotFoundError:
         print(f"Error: File '{filename}' not found.")
         
-def voltage_to_distance(volts):
-    """
+if __name__ == "__main__":
     
-
-    Parameters
-    ----------
-    volts : FLOAT
-        voltage from DI-2008
-
-    Returns
-    -------
-    x : FLOAT
-        converted voltage from string pot to distance in mm
-
-    """
-    
-    x = 1270 * (volts/15)
-    
-    return x
-
-def convert_data(col):
-    """
-    Parameters
-    ----------
-    col : series
-        series to convert with control data
-
-    Returns
-    -------
-    converted series
-
-    """
-    cyclic_x = (183+60) #distance from fulcrum to approximate location on cyclic
-    
-    name = col.name
-    try: 
-        if name == "Pitch" or name == "Roll":
-            y0 = voltage_to_distance(col[1]) #246mm
-
-            col = col.apply(voltage_to_distance)
-            
-            col = col.apply(lambda y: math.tan((y-y0)/cyclic_x) )
-
-            col = col.apply(math.degrees)
-            print(f"Max: {col.max()}")
-            
-            return col
-        else:
-        
-            return col
-    
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-
-if "__main__":
+    import plotly.io as pio
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+    pio.renderers.default='browser'
     
     path = r'C:/Users/gmorfitt/Documents/Marshall Data Analysis/Block A/ControlPos/helo_2025-07-28-16.50.41_Pilot 2_A_StageCheckA_ControlPos.csv'
     data = read_csv(path)
     
+    #Same session name, repair, filters and cache as slice_pilot, so the plot uses the stored zero reference (None plots the raw data)
+    filter_config = filters.DEFAULT_FILTERS
+    blockPath = os.path.dirname(os.path.dirname(path))
+    block = re.fullmatch(r"Block\s*(\w+)", os.path.basename(blockPath), re.IGNORECASE).group(1).upper()
+    pilot_id = extract_pilot_id(os.path.basename(path))
+    session = f"Block{block}_{pilot_id}"
+    data, preprocessing = slicing.prepare_control(data, blockPath, session,
+                                                  quality.scan(data, os.path.splitext(os.path.basename(path))[0]), filter_config)
+    
+    metaPath = os.path.join(blockPath, "session_metadata", f"{session}.json")
+    manuFile = batch.csv_by_pilot(os.path.join(blockPath, "ManeuverLog")).get(pilot_id)
+    if manuFile is not None:
+        zeros = zeroref.session_zero(data, metaPath, session, get_active_maneuvers(pd.read_csv(manuFile)), preprocessing = preprocessing)
+    else:
+        #without the maneuver log the idle time isn't known, use the stored reference or a first few seconds estimate that isn't stored
+        zeros = zeroref.load_session_zero(metaPath, session, zeroref.zero_source(data, preprocessing)) \
+            or zeroref.estimate_zero(data)
+    
     fig = make_subplots(rows=4, cols=1, shared_xaxes=True,)
     
 
@@ -112,7 +80,7 @@ if "__main__":
         g = random.randint(0, 255)
         b = random.randint(0, 255)
         
-        converted_col = convert_data(data[v])
+        converted_col = convert_data(data[v], zeros.get(v))
         min_y = converted_col.min()
         max_y = converted_col.max()
         
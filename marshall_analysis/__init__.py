@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Marshall flight data analysis.
+
+The ingest/convert core is imported straight away and only needs pandas
+and numpy. The other modules (scipy based filters and spectra, plotting
+with plotly/matplotlib) are only imported the first time they are used,
+e.g. ``marshall_analysis.spectral``, so batch jobs that just load and
+convert data don't pay for them.
+
+@author: gmorfitt
+"""
+
+import importlib
+
+from .ingest import (
+    import_csvs,
+    get_active_maneuvers,
+    extract_time,
+    extract_pilot_id,
+    link_flight_data_by_pilot,
+)
+from .convert import voltage_to_distance, convert_data
+
+_LAZY_MODULES = {
+    "cube",
+    "batch",
+    "detect",
+    "filters",
+    "flightpath",
+    "plotting",
+    "quality",
+    "slicing",
+    "spectral",
+    "zeroref",
+}
+
+__all__ = [
+    "import_csvs",
+    "get_active_maneuvers",
+    "extract_time",
+    "extract_pilot_id",
+    "link_flight_data_by_pilot",
+    "voltage_to_distance",
+    "convert_data",
+    *sorted(_LAZY_MODULES),
+]
+
+
+def __getattr__(name):
+    if name in _LAZY_MODULES:
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+Batch orchestrator: slices every pilot of every block as a separate job.
+
+Each block folder ("Block A", "Block B", ...) with ManeuverLog, States and
+ControlPos sub folders is picked up, and every maneuver log in it becomes a
+job. Jobs run in local worker processes. Job state is checkpointed to a
+JSON file after every finished job, so a run that crashes or is stopped
+carries on where it left off without redoing finished pilots. Failed jobs
+are recorded with their error and don't stop the others. Only as many
+jobs as there are workers are handed to the pool at a time, so when a
+worker dies and takes the pool down only the jobs in flight are affected;
+they go back into a fresh pool with the rest. A job that was in flight in
+two broken pools is run on its own, and if it kills its worker again it
+is recorded as crashed and runs on its own on the next run too.
+
+Usage:
+    python -m marshall_analysis.batch "<data folder>" "<reports folder>" --workers 4 --filters none
+
+A pilot only counts as done for the filter config it was run with, so
+changing --filters re-runs everything.
+
+@author: gmorfitt
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from .ingest import extract_pilot_id
+from . import cube, filters, quality, slicing, spectral
+
+STATE_FILE = "batch_state.json"
+MAX_POOL_BREAKS = 2  # broken pools a job can be in flight for before it runs on its own
+DATA_FOLDERS = ("ManeuverLog", "States", "ControlPos")
+
+
+def find_blocks(root):
+    """
+    Block folders under root, as {letter: path}, e.g. {"A": ".../Block A"}.
+    """
+    blocks = {}
+    for name in sorted(os.listdir(root)):
+        match = re.fullmatch(r"Block\s*(\w+)", name, re.IGNORECASE)
+        path = os.path.join(root, name)
+        if match and all(os.path.isdir(os.path.join(path, d)) for d in DATA_FOLDERS):
+            blocks[match.group(1).upper()] = path
+    return blocks
+
+
+def csv_by_pilot(folder):
+    """
+    {pilot id: csv path} for a data folder, without loading anything.
+    """
+    files = sorted(f for f in os.listdir(folder) if f.endswith(".csv"))
+    return {extract_pilot_id(f): os.path.join(folder, f) for f in files}
+
+
+def find_jobs(root):
+    """
+    Parameters
+    ----------
+    root : STR
+        folder holding the Block folders
+
+    Returns
+    -------
+    jobs : list of dict
+        one per pilot maneuver log, with the block, pilot and file paths
+
+    """
+    jobs = []
+    for block, block_path in find_blocks(root).items():
+        maneuvers = csv_by_pilot(os.path.join(block_path, "ManeuverLog"))
+        states = csv_by_pilot(os.path.join(block_path, "States"))
+        controls = csv_by_pilot(os.path.join(block_path, "ControlPos"))
+        for pilot_id, manu_file in maneuvers.items():
+            jobs.append({
+                "id": f"Block {block}/{pilot_id}",
+                "block": block,
+                "pilot": pilot_id,
+                "block_path": block_path,
+                "maneuver_file": manu_file,
+                "state_file": states.get(pilot_id),
+                "control_file": controls.get(pilot_id),
+            })
+    return jobs
+
+
+def run_job(job, report_path, filter_config=filters.DEFAULT_FILTERS):
+    """
+    Runs one pilot in a worker process, filter_config as in slicing.slice_pilot.
+
+    Returns
+    -------
+    result : dict
+        cube rows, workload rows, quality rows, segment count, bytes read and run time
+
+    """
+    started = time.time()
+    if job["control_file"] is None:
+        raise FileNotFoundError(f"No control file for {job['id']}")
+
+    files = [job["maneuver_file"], job["state_file"], job["control_file"]]
+    bytes_read = sum(os.path.getsize(f) for f in files if f is not None)
+
+    df_maneuver = pd.read_csv(job["maneuver_file"])
+    df_state = pd.read_csv(job["state_file"]) if job["state_file"] is not None else None
+    df_control = pd.read_csv(job["control_file"])
+
+    control_name = os.path.splitext(os.path.basename(job["control_file"]))[0]
+    quality_rows = [quality.scan(df_control, control_name)]
+    if df_state is not None:
+        quality_rows.append(quality.scan(df_state, os.path.splitext(os.path.basename(job["state_file"]))[0]))
+
+    segments = []
+    rows = slicing.slice_pilot(job["pilot"], df_maneuver, df_state, df_control, report_path,
+                               job["block_path"], job["block"], quality_rows[0], filter_config, segments)
+    return {
+        "rows": rows,
+        "workload": spectral.block_workload(pd.DataFrame(segments, columns=["Pilot", "Block", "Maneuver", "Start", "Data"])),
+        "quality": quality_rows,
+        "segments": int(rows[["Pilot", "Block", "Maneuver", "Start"]].drop_duplicates().shape[0]),
+        "bytes": bytes_read,
+        "seconds": time.time() - started,
+    }
+
+
+def load_state(path):
+    if os.path.exists(path):
+        with open(path) as f:
+            return json.load(f)
+    return {"jobs": {}, "runs": []}
+
+
+def save_state(state, path):
+    """
+    Writes the job state through a temp file so a crash mid-write can't corrupt it.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def run(root, report_path, workers=None, retry_failed=True, filter_config=filters.DEFAULT_FILTERS):
+    """
+    Parameters
+    ----------
+    root : STR
+        folder holding the Block folders
+    report_path : STR
+        folder for segment CSVs, cubes, quality tables and the job state
+    workers : INT, optional
+        worker processes, defaults to the number of CPUs
+    retry_failed : BOOL
+        run jobs that failed last time again
+    filter_config : list or None
+        filter steps for the control data, None for raw data
+
+    Returns
+    -------
+    summary : dict
+        throughput of this run
+
+    """
+    os.makedirs(report_path, exist_ok=True)
+    state_path = os.path.join(report_path, STATE_FILE)
+    state = load_state(state_path)
+
+    jobs = find_jobs(root)
+    filter_key = filters.config_key(filter_config)
+    done = {k for k, v in state["jobs"].items() if v["status"] == "done" and v.get("filters") == filter_key}
+    failed = {k for k, v in state["jobs"].items() if v["status"] in ("failed", "crashed")}
+    crashed = {k for k, v in state["jobs"].items() if v["status"] == "crashed"}
+    todo = [j for j in jobs if j["id"] not in done and (retry_failed or j["id"] not in failed)]
+    isolated = [j for j in todo if j["id"] in crashed]
+    print(f"{len(jobs)} jobs, {len(done)} already done, {len(todo)} to run ({len(isolated)} on their own)")
+
+    # the cube, workload and quality tables are only written here in the parent, one block at a time
+    cubes = {}
+    workloads = {}
+    quality_tables = {}
+
+    def block_cube(block):
+        if block not in cubes:
+            cubes[block] = cube.load_segments(os.path.join(report_path, f"Block{block}_cube_segments.csv"))
+        return cubes[block]
+
+    def block_workload(block):
+        if block not in workloads:
+            workloads[block] = spectral.load_workload(os.path.join(report_path, f"Block{block}_workload.csv"))
+        return workloads[block]
+
+    def block_quality(block):
+        if block not in quality_tables:
+            path = os.path.join(report_path, f"Block{block}_quality.csv")
+            quality_tables[block] = pd.read_csv(path) if os.path.exists(path) else None
+        return quality_tables[block]
+
+    started = time.time()
+    finished = 0
+    bytes_read = 0
+
+    def record(job, future, alone):
+        """
+        Stores the outcome of one job. Returns False when the pool broke
+        under a pooled job, which then still has to be run on its own.
+        """
+        nonlocal finished, bytes_read
+        entry = {"block": job["block"], "pilot": job["pilot"], "filters": filter_key,
+                 "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            result = future.result()
+        except BrokenProcessPool:
+            if not alone:
+                return False
+            entry.update({"status": "crashed", "error": "worker process died (e.g. out of memory)"})
+            print(f"CRASHED {job['id']}: worker died running it on its own")
+        except Exception as e:
+            entry.update({"status": "failed", "error": "".join(traceback.format_exception_only(type(e), e)).strip()})
+            print(f"FAILED {job['id']}: {entry['error']}")
+        else:
+            block = job["block"]
+            segments = cube.add_rows(cube.drop_pilot(block_cube(block), job["pilot"], block), result["rows"])
+            cubes[block] = segments
+            cube.save(segments, report_path, f"Block{block}_cube")
+
+            workload = pd.concat([cube.drop_pilot(block_workload(block), job["pilot"], block), result["workload"]],
+                                 ignore_index=True)
+            workloads[block] = workload
+            workload.to_csv(os.path.join(report_path, f"Block{block}_workload.csv"), index=False)
+
+            new_quality = pd.DataFrame(result["quality"])
+            table = block_quality(block)
+            if table is None:
+                # start from the new rows, concatenating onto an empty frame turns the counts into floats
+                table = new_quality
+            else:
+                table = pd.concat([table[~table["File"].isin(new_quality["File"])], new_quality], ignore_index=True)
+            counts = [c for c in quality.COUNT_COLUMNS if c in table.columns]
+            table[counts] = table[counts].astype("Int64")
+            quality_tables[block] = table
+            table.to_csv(os.path.join(report_path, f"Block{block}_quality.csv"), index=False)
+
+            entry.update({"status": "done", "segments": result["segments"],
+                          "bytes": result["bytes"], "seconds": round(result["seconds"], 2)})
+            finished += 1
+            bytes_read += result["bytes"]
+            print(f"Done {job['id']}: {result['segments']} segments in {result['seconds']:.1f} s")
+
+        state["jobs"][job["id"]] = entry
+        save_state(state, state_path)
+        return True
+
+    workers = workers or os.cpu_count() or 1
+    breaks = {}
+
+    def pool_broke(job):
+        breaks[job["id"]] = breaks.get(job["id"], 0) + 1
+        if breaks[job["id"]] >= MAX_POOL_BREAKS:
+            print(f"Worker pool broke under {job['id']} again, it will be re-run on its own")
+            isolated.append(job)
+            return []
+        return [job]
+
+    pending = [j for j in todo if j["id"] not in crashed]
+    while pending:
+        queue = pending
+        pending = []
+        broken = False
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            running = {}
+            while queue or running:
+                # never more jobs in the pool than workers, so a break only hits the jobs actually running
+                while queue and len(running) < workers and not broken:
+                    job = queue.pop(0)
+                    try:
+                        running[pool.submit(run_job, job, report_path, filter_config)] = job
+                    except BrokenProcessPool:
+                        broken = True
+                        pending += pool_broke(job)
+                if not running:
+                    break
+                finished_futures, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished_futures:
+                    job = running.pop(future)
+                    if not record(job, future, alone=False):
+                        broken = True
+                        pending += pool_broke(job)
+        if broken:
+            print(f"Worker pool broke, restarting it for {len(pending) + len(queue)} jobs")
+        pending += queue
+
+    # one single-worker pool per job, so a job that kills its worker can't take others with it
+    for job in isolated:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            future = pool.submit(run_job, job, report_path, filter_config)
+            record(job, future, alone=True)
+
+    elapsed = max(time.time() - started, 1e-9)
+    summary = {
+        "started": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(started)),
+        "filters": filter_key,
+        "pilots": finished,
+        "failed": sum(1 for j in todo if state["jobs"].get(j["id"], {}).get("status") == "failed"),
+        "crashed": sum(1 for j in todo if state["jobs"].get(j["id"], {}).get("status") == "crashed"),
+        "seconds": round(elapsed, 2),
+        "pilots/min": round(finished / elapsed * 60, 2),
+        "MB": round(bytes_read / 1e6, 2),
+        "MB/s": round(bytes_read / 1e6 / elapsed, 2),
+    }
+    state["runs"].append(summary)
+    save_state(state, state_path)
+    print(f"{summary['pilots']} pilots in {summary['seconds']} s "
+          f"({summary['pilots/min']} pilots/min, {summary['MB/s']} MB/s ingested), {summary['failed']} failed, {summary['crashed']} crashed")
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Slice every pilot of every block, resuming from the last run.")
+    parser.add_argument("root", help="folder holding the Block folders")
+    parser.add_argument("reports", help="folder for the outputs and the job state")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--skip-failed", action="store_true", help="don't retry jobs that failed last time")
+    parser.add_argument("--filters", default="default",
+                        help='control data filters: "default", "none" for raw data, or a JSON list of [name, params] steps')
+    args = parser.parse_args(argv)
+    summary = run(args.root, args.reports, args.workers, retry_failed=not args.skip_failed,
+                  filter_config=filters.parse_config(args.filters))
+    return 1 if summary["failed"] or summary["crashed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+String-pot voltage to control position conversion.
+
+@author: gmorfitt
+"""
+
+import numpy as np
+import pandas as pd
+
+CYCLIC_X = (183+60)  # distance from fulcrum to approximate location on cyclic, mm
+
+
+def voltage_to_distance(volts):
+    """
+
+
+    Parameters
+    ----------
+    volts : FLOAT or array
+        voltage from DI-2008
+
+    Returns
+    -------
+    x : FLOAT or array
+        converted voltage from string pot to distance in mm
+
+    """
+
+    x = 1270 * (np.asarray(volts, dtype=float)/15)
+
+    return x
+
+
+def cyclic_degrees(volts, y0):
+    """
+    Parameters
+    ----------
+    volts : array
+        Pitch or Roll voltage
+    y0 : FLOAT or array
+        neutral string pot distance in mm, per sample when drift is removed
+
+    Returns
+    -------
+    cyclic angle in degrees
+
+    """
+    return np.degrees(np.tan((voltage_to_distance(volts) - y0) / CYCLIC_X))
+
+
+def reference_distance(col, zero):
+    """
+    Neutral string pot distance in mm for every sample of col, using the
+    DataFrame index so sliced segments get the same reference as the session.
+    """
+    index = np.asarray(col.index, dtype=float)
+    volts = zero["zero"] + zero["drift"] * (index - zero["ref_index"])
+    return voltage_to_distance(volts)
+
+
+def convert_data(col, zero=None):
+    """
+    Parameters
+    ----------
+    col : series
+        series to convert with control data
+    zero : dict, optional
+        stored zero reference for this axis from zeroref.session_zero.
+        Without it the second sample is used as the neutral position.
+
+    Returns
+    -------
+    converted series
+
+    """
+    name = col.name
+
+    if name == "Pitch" or name == "Roll":
+        if zero is not None:
+            y0 = reference_distance(col, zero)
+        elif len(col) > 1: #in some rare instances there is only one index, and iloc[1] will return an error
+            y0 = voltage_to_distance(col.iloc[1])
+        else:
+            y0 = voltage_to_distance(col.iloc[0])
+
+        return pd.Series(cyclic_degrees(col, y0), index = col.index, name = name)
+    else:
+
+        return col
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Pilot summary cube: min/max/mean/time over limit/duration of each control
+axis per pilot x block x maneuver x axis.
+
+The slicer adds every segment it writes to a segment table (one row per
+segment and axis); the cube is rolled up from that table when it is saved,
+so queries only read a small pre-aggregated table instead of the raw CSVs.
+Re-running a pilot replaces its segments rather than adding them twice.
+
+@author: gmorfitt
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .quality import CONTROL_AXES, CONTROL_HZ
+# only the cyclic is converted to degrees, Collective/Pedal are still volts so they have no limit
+AXIS_LIMITS = {"Pitch": (-15, 15), "Roll": (-15, 15)}
+
+KEYS = ["Pilot", "Block", "Maneuver", "Axis"]
+SEGMENT_KEYS = ["Pilot", "Block", "Maneuver", "Start"]
+SEGMENT_COLUMNS = SEGMENT_KEYS + ["Axis", "Min", "Max", "Sum", "Samples", "Time over limit (s)", "Duration (s)"]
+
+
+def segment_rows(df, pilot, block, maneuver, start, axes=CONTROL_AXES, hz=CONTROL_HZ):
+    """
+    Parameters
+    ----------
+    df : DataFrame
+        converted control segment
+    pilot, block, maneuver : STR
+        cube dimensions for the segment
+    start : STR
+        segment start time, tells repeats of the same maneuver apart
+
+    Returns
+    -------
+    rows : DataFrame
+        one row per axis in the segment table layout
+
+    """
+    axes = [a for a in axes if a in df.columns]
+    data = df[axes].to_numpy(dtype=float)
+
+    lower = np.array([AXIS_LIMITS.get(a, (np.nan, np.nan))[0] for a in axes])
+    upper = np.array([AXIS_LIMITS.get(a, (np.nan, np.nan))[1] for a in axes])
+    over = np.sum((data < lower) | (data > upper), axis=0) / hz
+    over = np.where(np.isnan(lower), np.nan, over)
+
+    return pd.DataFrame({
+        "Pilot": pilot,
+        "Block": block,
+        "Maneuver": maneuver,
+        "Start": start,
+        "Axis": axes,
+        "Min": np.nanmin(data, axis=0) if len(data) else np.nan,
+        "Max": np.nanmax(data, axis=0) if len(data) else np.nan,
+        "Sum": np.nansum(data, axis=0),
+        "Samples": np.sum(~np.isnan(data), axis=0),
+        "Time over limit (s)": over,
+        "Duration (s)": len(data) / hz,
+    }, columns=SEGMENT_COLUMNS)
+
+
+def load_segments(path):
+    """
+    Segment table from disk, empty if it hasn't been written yet.
+    """
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype={"Start": str})
+    return pd.DataFrame(columns=SEGMENT_COLUMNS)
+
+
+def add_rows(segments, rows):
+    """
+    Adds segment rows to the segment table, replacing earlier runs of the
+    same pilot/block/maneuver/start.
+    """
+    if len(segments) == 0:
+        return rows.reset_index(drop=True)
+    if len(rows) == 0:
+        return segments
+    old = pd.MultiIndex.from_frame(segments[SEGMENT_KEYS].astype(str))
+    new = pd.MultiIndex.from_frame(rows[SEGMENT_KEYS].astype(str))
+    return pd.concat([segments[~old.isin(new)], rows], ignore_index=True)
+
+
+def drop_pilot(segments, pilot, block):
+    """
+    Removes every segment of a pilot in a block, used before re-running the pilot.
+    """
+    if len(segments) == 0:
+        return segments
+    same = (segments["Pilot"] == pilot) & (segments["Block"].astype(str) == str(block))
+    return segments[~same].reset_index(drop=True)
+
+
+def roll_up(segments):
+    """
+    Aggregates the segment table to pilot x block x maneuver x axis.
+    """
+    grouped = segments.groupby(KEYS, sort=True)
+    cube = grouped.agg(**{
+        "Min": ("Min", "min"),
+        "Max": ("Max", "max"),
+        "Sum": ("Sum", "sum"),
+        "Samples": ("Samples", "sum"),
+        "Time over limit (s)": ("Time over limit (s)", lambda s: s.sum(min_count=1)),
+        "Duration (s)": ("Duration (s)", "sum"),
+        "Segments": ("Start", "count"),
+    })
+    cube.insert(2, "Mean", cube["Sum"] / cube["Samples"].replace(0, np.nan))
+    return cube.drop(columns="Sum")
+
+
+def save(segments, folder, block_name="cube"):
+    """
+    Writes the segment table and the rolled up cube, returns the cube.
+    """
+    os.makedirs(folder, exist_ok=True)
+    segments.to_csv(os.path.join(folder, f"{block_name}_segments.csv"), index=False)
+    cube = roll_up(segments)
+    cube.to_csv(os.path.join(folder, f"{block_name}.csv"))
+    return cube
+
+
+def load_cube(path):
+    """
+    Reads a saved cube, indexed by pilot x block x maneuver x axis.
+    """
+    return pd.read_csv(path, dtype={"Block": str}).set_index(KEYS).sort_index()
+
+
+def query(cube, pilot=None, block=None, maneuver=None, axis=None):
+    """
+    Slice of the cube. Any dimension left as None is not filtered; maneuver
+    matches case-insensitively on part of the name, so "approach" also
+    finds "Approach (detected)".
+    """
+    mask = np.ones(len(cube), dtype=bool)
+    index = cube.index
+    if pilot is not None:
+        mask &= index.get_level_values("Pilot") == pilot
+    if block is not None:
+        mask &= index.get_level_values("Block") == block
+    if axis is not None:
+        mask &= index.get_level_values("Axis") == axis
+    if maneuver is not None:
+        mask &= index.get_level_values("Maneuver").str.contains(maneuver, case=False, regex=False)
+    return cube[mask]
+
+
+def exceedances(cube, axis, maneuver=None, limit=None):
+    """
+    Pilots that went past the axis limit, e.g. exceedances(cube, "Pitch", "approach").
+
+    Parameters
+    ----------
+    limit : FLOAT, optional
+        symmetric limit to use instead of AXIS_LIMITS
+
+    Returns
+    -------
+    rows of the cube where the limit was exceeded
+
+    """
+    rows = query(cube, maneuver=maneuver, axis=axis)
+    lower, upper = (-limit, limit) if limit is not None else AXIS_LIMITS[axis]
+    return rows[(rows["Min"] < lower) | (rows["Max"] > upper)]
+
+
+def min_max_tables(segments):
+    """
+    Per segment min and max of each axis plus the global min/max, the same
+    tables global_min_max builds from the segment CSVs: one row per segment,
+    one column per axis.
+    """
+    table = segments.pivot_table(index=SEGMENT_KEYS, columns="Axis", values=["Min", "Max"], aggfunc="first")
+    local_mins = table["Min"].reindex(columns=CONTROL_AXES).reset_index(drop=True)
+    local_maxs = table["Max"].reindex(columns=CONTROL_AXES).reset_index(drop=True)
+    return local_mins, local_maxs, local_mins.min(), local_maxs.max()
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Maneuver detection from the FOG state data, for sessions where the
+ManeuverLog is missing entries or they were logged late.
+
+Each rule is a threshold on a smoothed state signal. The thresholds are
+evaluated over the whole 200 Hz arrays at once and turned into intervals
+by run-length encoding, so the state data is only gone through once.
+Detected intervals are then reconciled with the logged ones.
+
+@author: gmorfitt
+"""
+
+import numpy as np
+import pandas as pd
+from scipy import ndimage
+
+from .quality import STATE_HZ
+
+SMOOTH_S = 1.0       # moving average applied before thresholds, s
+MAX_DROPOUT_S = 2.0  # a rule may drop out this long without ending the maneuver, s
+
+STEEP_BANK = 30.0            # degrees
+STEEP_MIN_S = 10.0
+STEEP_MIN_TURN = 90.0        # degrees of heading change
+CLIMB_RATE = 1.5             # m/s, ~300 ft/min
+CLIMB_MIN_S = 15.0
+CLIMB_MIN_GAIN = 30.0        # m, ~100 ft
+APPROACH_RATE = 1.0          # m/s descent
+APPROACH_MIN_S = 15.0
+APPROACH_MIN_LOSS = 30.0     # m
+APPROACH_SLOWDOWN = 0.6      # ground speed at the end / at the start
+
+MIN_OVERLAP = 0.5  # share of a detected interval that has to be covered by a logged one to match
+
+
+def find_runs(mask, min_len, max_gap=0):
+    """
+    Parameters
+    ----------
+    mask : array of bool
+        rule result per sample
+    min_len : INT
+        shortest run to keep, samples
+    max_gap : INT
+        runs separated by this many samples or fewer are joined
+
+    Returns
+    -------
+    starts, stops : array
+        sample index of each run, stop is exclusive
+
+    """
+    edges = np.diff(np.concatenate(([0], np.asarray(mask, dtype=np.int8), [0])))
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+
+    if max_gap and len(starts) > 1:
+        split = (starts[1:] - stops[:-1]) > max_gap
+        starts = starts[np.concatenate(([True], split))]
+        stops = stops[np.concatenate((split, [True]))]
+
+    long_enough = (stops - starts) >= min_len
+    return starts[long_enough], stops[long_enough]
+
+
+def fill_missing(values):
+    """
+    Linearly interpolates over NaN samples (held at the ends), so a dropout
+    doesn't read as 0 m or 0 degrees. All NaN stays all NaN.
+    """
+    values = np.asarray(values, dtype=float)
+    good = ~np.isnan(values)
+    if good.all() or not good.any():
+        return values
+    idx = np.arange(len(values))
+    return np.interp(idx, idx[good], values[good])
+
+
+def detect_maneuvers(df_state, hz=STATE_HZ):
+    """
+    Finds steep turns, climbs and approaches in the state data.
+
+    Parameters
+    ----------
+    df_state : DataFrame
+        FOG state data
+    hz : INT
+        sample rate of the state data
+
+    Returns
+    -------
+    intervals : DataFrame
+        Maneuver, Start, Stop (HH:MM:SS), same layout as flightpath.maneuver_intervals
+
+    """
+    times = df_state["Human Timestamp"].astype(str).str.slice(11, 19).to_numpy()
+    size = max(int(SMOOTH_S * hz), 1)
+
+    def raw(name):
+        return df_state[name].to_numpy(dtype=float)
+
+    def smooth(name):
+        return ndimage.uniform_filter1d(fill_missing(raw(name)), size, mode="nearest")
+
+    def ends_valid(starts, stops, *names):
+        # the endpoint checks below must not read interpolated values over a dropout
+        ok = np.ones(len(starts), dtype=bool)
+        for name in names:
+            ok &= np.isfinite(raw(name)[starts]) & np.isfinite(raw(name)[stops - 1])
+        return ok
+
+    roll = smooth("Roll (degrees)")
+    climb = -smooth("Velocity Down (m/s)")
+    height = smooth("Height (m)")
+    speed = np.hypot(smooth("Velocity East (m/s)"), smooth("Velocity North (m/s)"))
+
+    # unwrap the good samples only (np.unwrap carries a NaN forward), then bridge the gaps
+    heading = raw("Heading (degrees)")
+    good = ~np.isnan(heading)
+    if good.any():
+        heading = heading.copy()
+        heading[good] = np.degrees(np.unwrap(np.radians(heading[good])))
+        heading = fill_missing(heading)
+
+    gap = int(MAX_DROPOUT_S * hz)
+    found = []
+
+    for name, mask in (("Steep Turn Right", roll >= STEEP_BANK), ("Steep Turn Left", roll <= -STEEP_BANK)):
+        starts, stops = find_runs(mask, int(STEEP_MIN_S * hz), gap)
+        turned = (np.abs(heading[stops - 1] - heading[starts]) >= STEEP_MIN_TURN) \
+            & ends_valid(starts, stops, "Heading (degrees)")
+        found.append((name, starts[turned], stops[turned]))
+
+    starts, stops = find_runs(climb >= CLIMB_RATE, int(CLIMB_MIN_S * hz), gap)
+    gained = ((height[stops - 1] - height[starts]) >= CLIMB_MIN_GAIN) & ends_valid(starts, stops, "Height (m)")
+    found.append(("Normal Climb", starts[gained], stops[gained]))
+
+    starts, stops = find_runs(climb <= -APPROACH_RATE, int(APPROACH_MIN_S * hz), gap)
+    lost = (height[starts] - height[stops - 1]) >= APPROACH_MIN_LOSS
+    slowed = speed[stops - 1] <= APPROACH_SLOWDOWN * speed[starts]
+    valid = ends_valid(starts, stops, "Height (m)", "Velocity East (m/s)", "Velocity North (m/s)")
+    found.append(("Approach", starts[lost & slowed & valid], stops[lost & slowed & valid]))
+
+    intervals = pd.DataFrame({
+        "Maneuver": np.concatenate([np.full(len(s), name, dtype=object) for name, s, _ in found]),
+        "Start": np.concatenate([times[s] for _, s, _ in found]),
+        "Stop": np.concatenate([times[e - 1] for _, _, e in found]),
+    })
+    return intervals.sort_values("Start", kind="stable").reset_index(drop=True)
+
+
+def to_seconds(times):
+    """
+    HH:MM:SS strings to seconds since midnight.
+    """
+    return pd.to_timedelta(pd.Series(times, dtype=str).str.zfill(8), errors="coerce").dt.total_seconds().to_numpy()
+
+
+def reconcile(logged, detected, min_overlap=MIN_OVERLAP):
+    """
+    Merges logged and detected maneuver intervals.
+
+    A detected interval matches a logged one when at least min_overlap of
+    it lies inside the logged interval. Matched maneuvers keep the logged
+    name and stop, but start at the detected start when that is earlier
+    (START logged late). Detected intervals with no logged match are added.
+
+    Parameters
+    ----------
+    logged : DataFrame
+        output of flightpath.maneuver_intervals
+    detected : DataFrame
+        output of detect_maneuvers
+
+    Returns
+    -------
+    intervals : DataFrame
+        Maneuver, Start, Stop and Source ("log", "log+detected" or "detected")
+
+    """
+    log_start, log_stop = to_seconds(logged["Start"]), to_seconds(logged["Stop"])
+    det_start, det_stop = to_seconds(detected["Start"]), to_seconds(detected["Stop"])
+
+    # overlap of every detected interval with every logged one (detected x logged)
+    overlap = np.minimum(det_stop[:, None], log_stop[None, :]) - np.maximum(det_start[:, None], log_start[None, :])
+    length = np.maximum(det_stop - det_start, 1)[:, None]
+    share = np.clip(overlap, 0, None) / length
+
+    merged = logged.copy()
+    merged["Source"] = "log"
+    if share.size:
+        best = np.argmax(share, axis=1)
+        matched = share[np.arange(len(best)), best] >= min_overlap
+    else:
+        best = np.zeros(len(detected), dtype=int)
+        matched = np.zeros(len(detected), dtype=bool)
+
+    for d, l in zip(np.flatnonzero(matched), best[matched]):
+        merged.loc[merged.index[l], "Source"] = "log+detected"
+        if det_start[d] < log_start[l]:
+            merged.loc[merged.index[l], "Start"] = detected["Start"].iloc[d]
+
+    extra = detected[~matched].copy()
+    extra["Source"] = "detected"
+    merged = pd.concat([merged, extra], ignore_index=True)
+    return merged.sort_values("Start", kind="stable").reset_index(drop=True)
+
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Filtering stage for the string-pot control data.
+
+All filters run on a (samples x axes) array so Pitch, Roll, Collective and
+Pedal are filtered in one call. A filter config is a list of steps applied
+in order, e.g.
+
+    [("despike", {"kernel": 5}), ("butter", {"cutoff": 5.0}), ("savgol", {"window": 51, "order": 5})]
+
+@author: gmorfitt
+"""
+
+import os
+import json
+import hashlib
+
+import numpy as np
+from scipy import signal, ndimage
+
+from .quality import CONTROL_AXES, CONTROL_HZ
+
+DEFAULT_FILTERS = [
+    ("despike", {"kernel": 5, "threshold": 3.0}),
+    ("butter", {"cutoff": 5.0, "order": 4}),
+]
+
+
+def median_despike(data, kernel=5, threshold=3.0):
+    """
+    Replaces spikes with the running median.
+
+    Parameters
+    ----------
+    data : array
+        samples x axes
+    kernel : INT
+        running median length in samples
+    threshold : FLOAT
+        a sample is a spike when it is more than threshold * MAD from the running median
+
+    Returns
+    -------
+    despiked array
+
+    """
+    med = ndimage.median_filter(data, size=(kernel, 1), mode="nearest")
+    resid = data - med
+    mad = np.median(np.abs(resid), axis=0) * 1.4826
+    mad[mad == 0] = np.finfo(float).eps
+    return np.where(np.abs(resid) > threshold * mad, med, data)
+
+
+def butter_zero_phase(data, cutoff=5.0, order=4, hz=CONTROL_HZ):
+    """
+    Zero-phase (forward-backward) Butterworth low pass.
+
+    Parameters
+    ----------
+    data : array
+        samples x axes
+    cutoff : FLOAT
+        cutoff frequency in Hz
+    order : INT
+        filter order
+    hz : INT
+        sample rate of data
+
+    Returns
+    -------
+    filtered array
+
+    """
+    sos = signal.butter(order, cutoff, btype="low", fs=hz, output="sos")
+    # sosfiltfilt needs a few filter lengths of data, short segments are left alone
+    if len(data) <= 3 * (2 * len(sos) + 1):
+        return data
+    return signal.sosfiltfilt(sos, data, axis=0)
+
+
+def savgol(data, window=51, order=5):
+    """
+    Savitzky-Golay smoothing, window is in samples.
+    """
+    if len(data) < window:
+        return data
+    return signal.savgol_filter(data, window, order, axis=0)
+
+
+FILTERS = {
+    "despike": median_despike,
+    "butter": butter_zero_phase,
+    "savgol": savgol,
+}
+
+
+def apply_filters(data, config=DEFAULT_FILTERS, hz=CONTROL_HZ):
+    """
+    Runs every step of config over a samples x axes array.
+    """
+    out = np.asarray(data, dtype=float)
+    for name, params in config:
+        params = dict(params)
+        if name == "butter":
+            params.setdefault("hz", hz)
+        out = FILTERS[name](out, **params)
+    return out
+
+
+def filter_controls(df, config=DEFAULT_FILTERS, columns=CONTROL_AXES, hz=CONTROL_HZ):
+    """
+    Parameters
+    ----------
+    df : DataFrame
+        control data
+    config : list
+        filter steps, see DEFAULT_FILTERS
+
+    Returns
+    -------
+    copy of df with the control axes filtered
+
+    """
+    columns = [c for c in columns if c in df.columns]
+    out = df.copy()
+    if not columns or len(df) == 0:
+        return out
+    # filters don't cope with gaps, fill them from the neighbouring samples first
+    data = df[columns].interpolate(limit_direction="both").to_numpy(dtype=float)
+    out[columns] = apply_filters(data, config, hz)
+    return out
+
+
+def config_key(config, hz=CONTROL_HZ):
+    """
+    Short stable hash of a filter config and sample rate, used in the cache
+    file name and to record which filters a result was made with.
+    None (no filtering) gives "raw".
+    """
+    if config is None:
+        return "raw"
+    text = json.dumps({"hz": hz, "steps": [[name, params] for name, params in config]}, sort_keys=True)
+    return hashlib.sha1(text.encode()).hexdigest()[:12]
+
+
+def parse_config(text):
+    """
+    Filter config from the command line: "default", "none" (raw data) or a
+    JSON list of [name, params] steps, e.g. '[["savgol", {"window": 51, "order": 5}]]'.
+    """
+    if text is None or text.lower() == "default":
+        return DEFAULT_FILTERS
+    if text.lower() in ("none", "raw"):
+        return None
+    config = [(name, dict(params)) for name, params in json.loads(text)]
+    unknown = [name for name, _ in config if name not in FILTERS]
+    if unknown:
+        raise ValueError(f"Unknown filters {unknown}, choose from {sorted(FILTERS)}")
+    return config
+
+
+def cached_filter_controls(df, name, cache_dir, config=DEFAULT_FILTERS, columns=CONTROL_AXES, hz=CONTROL_HZ):
+    """
+    filter_controls with an on-disk cache per file + filter config.
+
+    Parameters
+    ----------
+    df : DataFrame
+        control data
+    name : STR
+        file name the data came from (key from import_csvs)
+    cache_dir : STR
+        folder for the cached results
+    config : list or None
+        filter steps, None returns the data unfiltered
+
+    Returns
+    -------
+    copy of df with the control axes filtered
+
+    """
+    if config is None:
+        return df.copy()
+    columns = [c for c in columns if c in df.columns]
+    raw = np.ascontiguousarray(df[columns].to_numpy(dtype=float))
+    # the data hash catches a file that was re-exported under the same name
+    data_hash = hashlib.sha1(raw.tobytes()).hexdigest()
+    cache_file = os.path.join(cache_dir, f"{name}_{config_key(config, hz)}.npz")
+
+    if os.path.exists(cache_file):
+        with np.load(cache_file, allow_pickle=False) as cached:
+            if str(cached["data_hash"]) == data_hash and list(cached["columns"]) == columns:
+                out = df.copy()
+                out[columns] = cached["filtered"]
+                return out
+
+    out = filter_controls(df, config, columns, hz)
+    os.makedirs(cache_dir, exist_ok=True)
+    np.savez(cache_file, filtered=out[columns].to_numpy(dtype=float),
+             columns=np.array(columns), data_hash=np.array(data_hash))
+    return out
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+Flight-path processing for the FOG state files.
+
+Everything here works on whole 200 Hz arrays at once; per-maneuver values
+are taken from the full-length results by slicing, so nothing is recomputed
+per maneuver.
+
+@author: gmorfitt
+"""
+
+import numpy as np
+import pandas as pd
+
+from .quality import STATE_HZ
+
+EARTH_RADIUS = 6371000  # mean earth radius in m
+GRAVITY = 9.80665       # m/s^2
+MIN_TURN_SPEED = 5.0    # m/s, below this the coordinated turn rate is meaningless
+
+
+def maneuver_intervals(maneuver_table):
+    """
+    Pairs START/STOP rows from get_active_maneuvers into intervals.
+
+    Parameters
+    ----------
+    maneuver_table : DataFrame
+        output of get_active_maneuvers (Time, Active_Maneuver)
+
+    Returns
+    -------
+    intervals : DataFrame
+        one row per maneuver with Maneuver, Start and Stop (HH:MM:SS).
+        A START without a matching STOP on the next row is dropped.
+
+    """
+    if len(maneuver_table) < 2:
+        return pd.DataFrame(columns=["Maneuver", "Start", "Stop"])
+    times = maneuver_table["Time"].astype(str).str.zfill(8).to_numpy()
+    parts = maneuver_table["Active_Maneuver"].str.split("_", n=1, expand=True)
+    kind = parts[0].str.lower().to_numpy()
+    name = parts[1].to_numpy()
+
+    # a START is only usable when the very next row stops the same maneuver
+    is_start = kind[:-1] == "start"
+    next_stops = (kind[1:] == "stop") & (name[1:] == name[:-1])
+    idx = np.flatnonzero(is_start & next_stops)
+
+    return pd.DataFrame({
+        "Maneuver": name[idx],
+        "Start": times[idx],
+        "Stop": times[idx + 1],
+    })
+
+
+def ground_track(v_e, v_n):
+    """
+    Ground track in degrees true (0-360) from the NED velocities.
+    """
+    return np.degrees(np.arctan2(np.asarray(v_e, dtype=float), np.asarray(v_n, dtype=float))) % 360
+
+
+def cumulative_distance(lat, lon):
+    """
+    Parameters
+    ----------
+    lat, lon : array
+        latitude and longitude in degrees
+
+    Returns
+    -------
+    dist : array
+        cumulative great-circle distance flown in m, starting at 0
+
+    """
+    lat = np.radians(np.asarray(lat, dtype=float))
+    lon = np.radians(np.asarray(lon, dtype=float))
+
+    dlat = np.diff(lat)
+    dlon = np.diff(lon)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    step = 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+    return np.concatenate(([0.0], np.cumsum(np.nan_to_num(step))))
+
+
+def turn_rate(heading, hz=STATE_HZ):
+    """
+    Turn rate in deg/s from heading in degrees. The heading is unwrapped
+    first so the 359 -> 0 crossing does not show up as a spike. Missing
+    headings only blank the turn rate at that sample and its neighbours.
+    """
+    heading = np.asarray(heading, dtype=float)
+    if len(heading) < 2:
+        return np.zeros(len(heading))
+    missing = np.isnan(heading)
+    if missing.all():
+        return np.full(len(heading), np.nan)
+
+    # unwrap the good samples only (np.unwrap carries a NaN forward), then bridge the gaps
+    idx = np.arange(len(heading))
+    good = np.degrees(np.unwrap(np.radians(heading[~missing])))
+    unwrapped = np.interp(idx, idx[~missing], good)
+    rate = np.gradient(unwrapped) * hz
+
+    if missing.any():
+        near = missing.copy()
+        near[1:] |= missing[:-1]
+        near[:-1] |= missing[1:]
+        rate[near] = np.nan
+    return rate
+
+
+def coordinated_turn_rate(bank, speed):
+    """
+    Turn rate in deg/s expected from bank angle at a given ground speed
+    for a coordinated turn (g * tan(bank) / V). Samples slower than
+    MIN_TURN_SPEED are returned as NaN.
+    """
+    bank = np.radians(np.asarray(bank, dtype=float))
+    speed = np.asarray(speed, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.degrees(GRAVITY * np.tan(bank) / speed)
+    return np.where(speed >= MIN_TURN_SPEED, rate, np.nan)
+
+
+def to_local_xy(lat, lon):
+    """
+    Projects lat/lon in degrees onto a flat x/y plane in m, centred on the
+    first point. Good enough over the size of a single maneuver.
+    """
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    if len(lat) == 0:
+        return lat, lon
+    lat0 = np.radians(lat[0])
+    x = np.radians(lon - lon[0]) * EARTH_RADIUS * np.cos(lat0)
+    y = np.radians(lat - lat[0]) * EARTH_RADIUS
+    return x, y
+
+
+def douglas_peucker(x, y, tolerance):
+    """
+    Douglas-Peucker line simplification.
+
+    Parameters
+    ----------
+    x, y : array
+        track coordinates (same units as tolerance)
+    tolerance : FLOAT
+        max distance a dropped point may be from the simplified line
+
+    Returns
+    -------
+    keep : array of bool
+        mask of the points to keep, first and last are always kept
+
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    keep = np.zeros(n, dtype=bool)
+    if n == 0:
+        return keep
+    keep[0] = keep[-1] = True
+
+    # explicit stack instead of recursion, a full maneuver is tens of thousands of points
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+
+        dx = x[last] - x[first]
+        dy = y[last] - y[first]
+        px = x[first + 1:last] - x[first]
+        py = y[first + 1:last] - y[first]
+        seg_len = np.hypot(dx, dy)
+        if seg_len == 0:
+            dist = np.hypot(px, py)
+        else:
+            dist = np.abs(dx * py - dy * px) / seg_len
+
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = first + 1 + i
+            keep[split] = True
+            stack.append((first, split))
+            stack.append((split, last))
+
+    return keep
+
+
+def track_summary(df_state, intervals, tolerance=5.0, hz=STATE_HZ):
+    """
+    Ground track, distance, turn rate and bank/turn-rate consistency for
+    every maneuver.
+
+    Parameters
+    ----------
+    df_state : DataFrame
+        FOG state data
+    intervals : DataFrame
+        output of maneuver_intervals
+    tolerance : FLOAT
+        Douglas-Peucker tolerance in m for the returned tracks
+    hz : INT
+        sample rate of the state data
+
+    Returns
+    -------
+    summary : DataFrame
+        one row per maneuver
+    tracks : list of DataFrame
+        simplified Latitude/Longitude track per maneuver, same order as summary
+
+    """
+    times = df_state["Human Timestamp"].astype(str).str.slice(11, 19).to_numpy()
+    lat = df_state["Latitude (degrees)"].to_numpy(dtype=float)
+    lon = df_state["Longitude (degrees)"].to_numpy(dtype=float)
+    v_e = df_state["Velocity East (m/s)"].to_numpy(dtype=float)
+    v_n = df_state["Velocity North (m/s)"].to_numpy(dtype=float)
+    heading = df_state["Heading (degrees)"].to_numpy(dtype=float)
+    bank = df_state["Roll (degrees)"].to_numpy(dtype=float)
+
+    # full length arrays, computed once
+    speed = np.hypot(v_e, v_n)
+    track = ground_track(v_e, v_n)
+    dist = cumulative_distance(lat, lon)
+    rate = turn_rate(heading, hz)
+    expected = coordinated_turn_rate(bank, speed)
+
+    # timestamps are HH:MM:SS strings in order, so the bounds can be searched for
+    starts = np.searchsorted(times, intervals["Start"].to_numpy(), side="left")
+    stops = np.searchsorted(times, intervals["Stop"].to_numpy(), side="right")
+
+    rows = []
+    tracks = []
+    for (_, interval), a, b in zip(intervals.iterrows(), starts, stops):
+        n = b - a
+        row = {
+            "Maneuver": interval["Maneuver"],
+            "Start": interval["Start"],
+            "Stop": interval["Stop"],
+            "Samples": n,
+            "Duration (s)": n / hz,
+        }
+        if n < 2:
+            rows.append(row)
+            tracks.append(pd.DataFrame(columns=["Latitude (degrees)", "Longitude (degrees)"]))
+            continue
+
+        seg = slice(a, b)
+        track_rad = np.radians(track[seg])
+        err = rate[seg] - expected[seg]
+        valid = ~np.isnan(err)
+
+        row.update({
+            "Distance (m)": dist[b - 1] - dist[a],
+            "Mean ground speed (m/s)": np.nanmean(speed[seg]),
+            "Mean track (degrees)": np.degrees(np.arctan2(np.nanmean(np.sin(track_rad)), np.nanmean(np.cos(track_rad)))) % 360,
+            "Heading change (degrees)": np.nansum(rate[seg]) / hz,
+            "Mean turn rate (deg/s)": np.nanmean(rate[seg]),
+            "Max turn rate (deg/s)": np.nanmax(np.abs(rate[seg])),
+            "Mean bank (degrees)": np.nanmean(bank[seg]),
+            # measured minus bank-angle turn rate: bias shows slips/skids, RMS the overall mismatch
+            "Turn rate bias (deg/s)": np.mean(err[valid]) if valid.any() else np.nan,
+            "Turn rate RMS error (deg/s)": np.sqrt(np.mean(err[valid] ** 2)) if valid.any() else np.nan,
+        })
+
+        x, y = to_local_xy(lat[seg], lon[seg])
+        keep = douglas_peucker(x, y, tolerance)
+        row["Track points"] = int(keep.sum())
+        rows.append(row)
+        tracks.append(pd.DataFrame({
+            "Latitude (degrees)": lat[seg][keep],
+            "Longitude (degrees)": lon[seg][keep],
+        }))
+
+    return pd.DataFrame(rows), tracks
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Loading and linking the ManeuverLog, States and ControlPos CSVs.
+
+@author: gmorfitt
+"""
+
+import os
+import re
+
+import pandas as pd
+
+from . import quality
+
+
+def import_csvs(folder_path, quality_rows=None):
+    """
+    Loads every CSV in folder_path into a dict keyed by file name.
+    When a list is passed as quality_rows, each file is scanned by
+    quality.scan as it is loaded and its row appended to the list.
+    """
+
+    csv_files = [f for f in os.listdir(folder_path) if f.endswith('.csv')]
+    if not csv_files:
+        print("No CSV files found in the folder.")
+        return {}
+
+    dataframes = {}
+    for file in csv_files:
+        full_path = os.path.join(folder_path, file)
+        try:
+            df = pd.read_csv(full_path)
+            key_name = os.path.splitext(file)[0]  # remove .csv extension
+            dataframes[key_name] = df
+            if quality_rows is not None:
+                quality_rows.append(quality.scan(df, key_name))
+            print(f"Loaded: {file} ({len(df)} rows, {len(df.columns)} columns)")
+        except Exception as e:
+            print(f"Error loading {file}: {e}")
+
+    return dataframes
+
+
+def get_active_maneuvers(df, column="Maneuver/Comments"):
+    """
+    Returns only maneuver rows (START/STOP) with Time and Active_Maneuver columns.
+    Example: START_Straight Level, STOP_Normal Climb
+    """
+    # Clean up text
+    df[column] = df[column].str.strip().str.strip('"')
+
+    # Keep only maneuver rows
+    df = df[df[column].str.startswith("MANEUVER_")].copy()
+
+    # Extract type and maneuver name
+    parts = df[column].str.extract(r"MANEUVER_(START|STOP)_(.*)")
+    df["Active_Maneuver"] = parts[0] + "_" + parts[1]
+
+    # Keep only needed columns
+    return df[["Time", "Active_Maneuver"]].reset_index(drop=True)
+
+
+def extract_time(series):
+    if isinstance(series, str):
+    # Single string: slice characters 11-19
+        return series[11:19]
+    else:
+        series = pd.Series(series)
+        return series.str.slice(11, 19)
+
+
+def extract_pilot_id(filename):
+    """
+    Extracts and normalizes pilot identifier from filename, e.g. 'Pilot 5', 'Pilot_05', etc.
+    """
+    match = re.search(r'pilot[_\s-]*(\d+)|pilot\s*instructor', filename, re.IGNORECASE)
+    if match:
+        # handle both numbered pilots and "Instructor"
+        if match.group(1):
+            return f"pilot {int(match.group(1))}"
+        else:
+            return "pilot instructor"
+    return ""
+
+
+def link_flight_data_by_pilot(maneuver_dfs, state_dfs, control_dfs, return_combined=False):
+    """
+    Links maneuver, state, and control DataFrames by pilot ID (based on filename content).
+
+    Returns a dict of matched DataFrames per pilot if return_combined=True.
+    """
+
+    # Build lookups using pilot ID from filenames
+    state_by_pilot = {extract_pilot_id(fname): df for fname, df in state_dfs.items()}
+    control_by_pilot = {extract_pilot_id(fname): df for fname, df in control_dfs.items()}
+
+    combined_data = {} if return_combined else None
+
+    for manu_fname, manu_df in maneuver_dfs.items():
+        pilot_id = extract_pilot_id(manu_fname)
+
+        state_df = state_by_pilot.get(pilot_id)
+        control_df = control_by_pilot.get(pilot_id)
+
+        print(f"\nPilot: {pilot_id}")
+        print(f"  Maneuver file: {manu_fname}")
+
+        if state_df is not None:
+            print(f"State file found")
+        else:
+            print("No matching state file found")
+
+        if control_df is not None:
+            print(f"Control file found")
+        else:
+            print("No matching control file found")
+
+        if return_combined:
+            combined_data[pilot_id] = {
+                "maneuver": manu_df,
+                "state": state_df,
+                "control": control_df
+            }
+
+    return combined_data
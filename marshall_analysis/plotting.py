@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Plotly reports. plotly is imported inside the functions so importing this
+module (or the package) doesn't load it.
+
+@author: gmorfitt
+"""
+
+import random
+
+CONTROL_COLUMNS = ["Pitch", "Roll", "Collective", "Pedal"]
+
+
+def random_rgb():
+    r = random.randint(0, 255)
+    g = random.randint(0, 255)
+    b = random.randint(0, 255)
+    return f'rgb({r},{g},{b})'
+
+
+def maneuver_report(dataToPlot, FOG_timestamp, control_timestamp, maneuver_table, filename):
+    """
+    Parameters
+    ----------
+    dataToPlot : list of series
+        signals to plot, one subplot each. Control columns are plotted
+        against control_timestamp, everything else against FOG_timestamp
+    maneuver_table : DataFrame
+        Time/Active_Maneuver rows drawn as lines on every subplot
+    filename : STR
+        html file to write
+
+    """
+    from plotly.subplots import make_subplots
+    import plotly.graph_objects as go
+
+    fig = make_subplots(rows=len(dataToPlot),
+    cols=1,
+    shared_xaxes=True)
+
+    for i, v in enumerate(dataToPlot, start = 1):
+        print(f"Plotting {v.name}")
+        if v.name in CONTROL_COLUMNS:
+             signal = go.Scatter(x=control_timestamp,y=v,name = str(v.name), line = dict(color='red'))
+             fig.add_trace(signal, row = i,col = 1)
+        else:
+             signal = go.Scatter(x=FOG_timestamp,y=v,name = str(v.name), line = dict(color='blue'))
+             fig.add_trace(signal, row = i,col = 1)
+
+        for currentTime, currentMan in zip(maneuver_table["Time"], maneuver_table["Active_Maneuver"]):
+            fig.add_vline(x=currentTime, line_dash="dash", line_color="gray", row=i, col=1)
+            fig.add_annotation(
+                x=currentTime,
+                y=0,
+                text=currentMan,
+                row=i,
+                col=1
+            )
+    fig.update_layout(height = 1500)
+    fig.write_html(filename, auto_open=False)
+
+
+def track_map(track_table, tracks, filename):
+    """
+    Writes the simplified per-maneuver tracks from flightpath.track_summary
+    to an html map.
+    """
+    import plotly.graph_objects as go
+
+    track_fig = go.Figure()
+    for (_, man), track in zip(track_table.iterrows(), tracks):
+        track_fig.add_trace(go.Scatter(x=track["Longitude (degrees)"], y=track["Latitude (degrees)"],
+                                       mode = "lines", name = f'{man["Maneuver"]} {man["Start"]}'))
+    track_fig.update_xaxes(title_text = "Longitude (degrees)")
+    track_fig.update_yaxes(title_text = "Latitude (degrees)", scaleanchor = "x")
+    track_fig.write_html(filename, auto_open=False)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+Per-pilot slicing of the control data into maneuver segments.
+
+This is the body of the slicecontroldata loop as a function, so the script
+and the batch orchestrator run exactly the same steps: reconcile logged
+and detected maneuvers, repair/filter/zero/convert the control data, then
+write one CSV per maneuver and return the summary cube rows.
+
+@author: gmorfitt
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from .ingest import get_active_maneuvers
+from .convert import convert_data
+from . import cube, detect, filters, flightpath, quality, zeroref
+
+
+def prepare_control(df_control, block_path, prefix, quality_row=None, filter_config=filters.DEFAULT_FILTERS):
+    """
+    Repairs and filters a session's control data (still in volts). Every
+    script that zeros or converts a session goes through this, so the zero
+    reference is always estimated from the same frame.
+
+    Parameters
+    ----------
+    prefix : STR
+        session name, e.g. "BlockA_pilot 3", names the filter cache file
+    quality_row, filter_config :
+        as in slice_pilot
+
+    Returns
+    -------
+    df_control : DataFrame
+        prepared control data
+    preprocessing : dict
+        whether it was repaired and the filter config key
+
+    """
+    repaired = quality_row is not None and quality.needs_repair(quality_row)
+    if repaired:
+        print("Repairing duplicate/out of order timestamps and out of range voltages")
+        df_control = quality.repair(df_control)
+
+    filterCachePath = os.path.join(block_path, "ControlPos", "filter_cache")
+    df_control = filters.cached_filter_controls(df_control, f"{prefix}_controlpos", filterCachePath, filter_config) #Filter all four axes at once
+    return df_control, {"repaired": repaired, "filters": filters.config_key(filter_config)}
+
+
+def slice_pilot(pilot_id, df_maneuver, df_state, df_control, report_path, block_path,
+                block="A", quality_row=None, filter_config=filters.DEFAULT_FILTERS, segments=None):
+    """
+    Parameters
+    ----------
+    pilot_id : STR
+        e.g. "pilot 3"
+    df_maneuver, df_state, df_control : DataFrame
+        the pilot's ManeuverLog, States and ControlPos data. df_state may be
+        None, then only the logged maneuvers are used
+    report_path : STR
+        folder the segment CSVs are written to
+    block_path : STR
+        block folder, holds the session metadata and the filter cache
+    block : STR
+        block letter, used in file names and the cube
+    quality_row : dict, optional
+        quality.scan row of the control file, repairs it when needed
+    filter_config : list or None
+        filter steps run on the control data before converting (see
+        filters.DEFAULT_FILTERS). None slices the raw data, use that when
+        peak values or the full input spectrum matter
+    segments : list, optional
+        if given, every segment written is appended to it as a dict of
+        Pilot, Block, Maneuver, Start and Data (the converted segment), the
+        segment table spectral.block_workload takes
+
+    Returns
+    -------
+    rows : DataFrame
+        summary cube segment rows for every segment written
+
+    """
+    prefix = f"Block{block}_{pilot_id}"
+    newTable = get_active_maneuvers(df_maneuver)
+
+    #Fill in missing/late log entries with maneuvers found in the state data
+    intervals = flightpath.maneuver_intervals(newTable)
+    if df_state is not None:
+        intervals = detect.reconcile(intervals, detect.detect_maneuvers(df_state))
+    else:
+        intervals["Source"] = "log"
+    intervals.to_csv(os.path.join(report_path, f"{prefix}_maneuvers.csv"), index = False)
+
+    df_control, preprocessing = prepare_control(df_control, block_path, prefix, quality_row, filter_config)
+    control_gaps = quality.find_gaps(df_control)
+
+    metaPath = os.path.join(block_path, "session_metadata", f"{prefix}.json") #one file per session so parallel jobs don't overwrite each other
+    zeros = zeroref.session_zero(df_control, metaPath, prefix, newTable, preprocessing = preprocessing) #worked out once per session, then reused
+    df_control = df_control.apply(lambda c: convert_data(c, zeros.get(c.name))) #Convert data before slicing based on manuevers
+
+    dfcontrol_times = df_control['Time'].str.slice(0,8) #timestamp is different in this col so need to convert it
+    # first sample at or after the start, and as before the first sample of the stop second (the next one
+    # if that second is missing), clamped to the end of the recording
+    starts = np.searchsorted(dfcontrol_times, intervals["Start"].to_numpy())
+    stops = np.minimum(np.searchsorted(dfcontrol_times, intervals["Stop"].to_numpy()), len(df_control) - 1)
+    before_recording = np.searchsorted(dfcontrol_times, intervals["Stop"].to_numpy(), side = "right") == 0
+
+    requested = zip(quality.clock_seconds(intervals["Start"]), quality.clock_seconds(intervals["Stop"]))
+
+    rows = []
+    for (_, v), a, b, early, (t0, t1) in zip(intervals.iterrows(), starts, stops, before_recording, requested):
+        currentManeuver = v["Maneuver"]
+        if v["Source"] == "detected":
+            currentManeuver = f"{currentManeuver} (detected)"
+        if a >= len(df_control) or early:
+            print(f"Skipping {currentManeuver} {v['Start']}-{v['Stop']}, outside the control recording")
+            continue
+        if a > b:
+            print(f"Skipping {currentManeuver} {v['Start']}-{v['Stop']}, stop is before start")
+            continue
+        startManueverIndex = df_control.index[a]
+        nextManeuverIndex = df_control.index[b]
+
+        if not quality.segment_ok(control_gaps, t0, t1): #against the requested times, a gap can swallow the start/stop
+            print(f"Skipping {currentManeuver}, too much control data missing")
+            continue
+        controlSegmentSection = df_control.loc[startManueverIndex:nextManeuverIndex]
+
+        # start time in the name, a maneuver can be flown more than once per session
+        fileName = f"{prefix}_{currentManeuver}_{v['Start'].replace(':', '')}_controlpos.csv"
+        controlSegmentSection.to_csv(os.path.join(report_path, fileName), index = False)
+        rows.append(cube.segment_rows(controlSegmentSection, pilot_id, block, currentManeuver, v["Start"]))
+        if segments is not None:
+            segments.append({"Pilot": pilot_id, "Block": block, "Maneuver": currentManeuver,
+                             "Start": v["Start"], "Data": controlSegmentSection})
+
+    if rows:
+        return pd.concat(rows, ignore_index=True)
+    return pd.DataFrame(columns=cube.SEGMENT_COLUMNS)
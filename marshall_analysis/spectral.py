@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""
+Frequency-domain pilot workload from the converted 50 Hz control segments.
+
+Welch's method is done for a whole block at once: every segment and axis
+is cut into overlapping windows, all windows are stacked into one array
+and go through a single FFT call, then the periodograms are averaged back
+per segment. Workload metrics come from the averaged PSDs.
+
+The PSDs are of the control data as slice_pilot left it, i.e. after its
+filter stage. With the default filters everything above the 5 Hz low-pass
+is attenuated, so the power, cutoff and mean frequency describe the
+filtered inputs; slice with filter_config=None for the raw input spectrum.
+
+@author: gmorfitt
+"""
+
+import os
+import re
+import sys
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft, signal
+
+from .quality import CONTROL_AXES, CONTROL_HZ
+NPERSEG = 256          # samples per Welch window, ~5 s at 50 Hz
+OVERLAP = 0.5          # share of a window overlapping the next one
+CUTOFF_FRACTION = 0.5  # cutoff frequency is where this share of the input power is reached
+
+
+def stack_windows(segments, axes=CONTROL_AXES, nperseg=NPERSEG, overlap=OVERLAP):
+    """
+    Parameters
+    ----------
+    segments : list of DataFrame
+        converted control data, one per maneuver
+    axes : list
+        control columns to use
+
+    Returns
+    -------
+    windows : array
+        all windows of all segments and axes, (windows x nperseg)
+    owner : array
+        row of the (segment x axis) table each window belongs to
+    counts : array
+        number of windows per (segment x axis) row
+
+    """
+    step = max(int(nperseg * (1 - overlap)), 1)
+    blocks = []
+    counts = np.zeros(len(segments) * len(axes), dtype=int)
+
+    for s, df in enumerate(segments):
+        data = df.reindex(columns=axes).to_numpy(dtype=float)
+        if len(data) < nperseg:
+            continue
+        # (windows x axes x nperseg), strided view so nothing is copied until the stack
+        view = sliding_window_view(data, nperseg, axis=0)[::step]
+        view = view[~np.isnan(view).any(axis=(1, 2))] if np.isnan(data).any() else view
+        blocks.append(view.transpose(1, 0, 2))
+        counts[s * len(axes):(s + 1) * len(axes)] = view.shape[0]
+
+    if not blocks:
+        return np.empty((0, nperseg)), np.empty(0, dtype=int), counts
+    windows = np.concatenate([b.reshape(-1, nperseg) for b in blocks])
+    owner = np.repeat(np.arange(len(counts)), counts)
+    return windows, owner, counts
+
+
+def batch_welch(segments, axes=CONTROL_AXES, hz=CONTROL_HZ, nperseg=NPERSEG, overlap=OVERLAP):
+    """
+    Welch PSD for every segment and axis (Hann window, mean removed per window).
+
+    Returns
+    -------
+    freqs : array
+        frequency bins in Hz
+    psd : array
+        (segments x axes x freqs) in units^2/Hz, NaN for segments shorter than nperseg
+
+    """
+    windows, owner, counts = stack_windows(segments, axes, nperseg, overlap)
+    freqs = fft.rfftfreq(nperseg, 1 / hz)
+    psd = np.full((len(counts), len(freqs)), np.nan)
+
+    if len(windows):
+        taper = signal.get_window("hann", nperseg)
+        windows = (windows - windows.mean(axis=1, keepdims=True)) * taper
+        # one FFT over every window of the block
+        spec = np.abs(fft.rfft(windows, axis=1, workers=-1)) ** 2 / (hz * np.sum(taper ** 2))
+        spec[:, 1:-1 if nperseg % 2 == 0 else None] *= 2
+
+        used = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[used])[:-1]))
+        psd[used] = np.add.reduceat(spec, starts, axis=0) / counts[used, None]
+
+    return freqs, psd.reshape(len(segments), len(axes), len(freqs))
+
+
+def workload_metrics(freqs, psd, cutoff_fraction=CUTOFF_FRACTION):
+    """
+    Parameters
+    ----------
+    freqs : array
+        frequency bins from batch_welch
+    psd : array
+        (... x freqs) PSDs
+
+    Returns
+    -------
+    dict of arrays shaped like psd without the last axis: power, rms,
+    cutoff frequency, mean frequency and peak frequency
+
+    """
+    df = freqs[1] - freqs[0]
+    power = np.sum(psd, axis=-1) * df
+    cumulative = np.cumsum(psd, axis=-1) * df
+    with np.errstate(invalid="ignore", divide="ignore"):
+        reached = cumulative >= cutoff_fraction * power[..., None]
+        cutoff = np.where(np.isnan(power), np.nan, freqs[np.argmax(reached, axis=-1)])
+        mean_freq = np.sum(psd * freqs, axis=-1) * df / power
+    peak = np.where(np.isnan(power), np.nan, freqs[np.argmax(np.nan_to_num(psd), axis=-1)])
+    return {
+        "Power": power,
+        "RMS": np.sqrt(power),
+        "Cutoff frequency (Hz)": cutoff,
+        "Mean frequency (Hz)": mean_freq,
+        "Peak frequency (Hz)": peak,
+    }
+
+
+def block_workload(segment_table, axes=CONTROL_AXES, hz=CONTROL_HZ, nperseg=NPERSEG):
+    """
+    Workload metrics for every pilot, maneuver and axis of a block in one run.
+
+    Parameters
+    ----------
+    segment_table : DataFrame
+        Pilot, Block, Maneuver, Start and Data (converted control DataFrame)
+        per segment, e.g. built from the segments list of slicing.slice_pilot
+
+    Returns
+    -------
+    workload : DataFrame
+        one row per pilot x maneuver (start) x axis
+
+    """
+    freqs, psd = batch_welch(list(segment_table["Data"]), axes, hz, nperseg)
+    metrics = workload_metrics(freqs, psd)
+
+    n = len(segment_table)
+    out = pd.DataFrame({
+        "Pilot": np.repeat(segment_table["Pilot"].to_numpy(), len(axes)),
+        "Block": np.repeat(segment_table["Block"].to_numpy(), len(axes)),
+        "Maneuver": np.repeat(segment_table["Maneuver"].to_numpy(), len(axes)),
+        "Start": np.repeat(segment_table["Start"].to_numpy(), len(axes)),
+        "Axis": np.tile(axes, n),
+        "Samples": np.repeat([len(d) for d in segment_table["Data"]], len(axes)),
+    })
+    for name, values in metrics.items():
+        out[name] = values.reshape(-1)
+    return out
+
+
+def load_workload(path):
+    """
+    Workload table from disk, empty if it hasn't been written yet.
+    """
+    if os.path.exists(path):
+        return pd.read_csv(path, dtype={"Block": str, "Start": str})
+    return pd.DataFrame(columns=["Pilot", "Block", "Maneuver", "Start", "Axis"])
+
+
+def load_segments(folder, block):
+    """
+    Reads back segment CSVs already written by slice_pilot
+    (Block{block}_{pilot}_{maneuver}_{HHMMSS start}_controlpos.csv), for
+    reports sliced before the workload was worked out while slicing.
+    """
+    pattern = re.compile(rf"Block{re.escape(block)}_(.+?)_(.+)_(\d{{2}})(\d{{2}})(\d{{2}})_controlpos\.csv$")
+    rows = []
+    for file in sorted(os.listdir(folder)):
+        match = pattern.match(file)
+        if match:
+            rows.append({
+                "Pilot": match.group(1),
+                "Block": block,
+                "Maneuver": match.group(2),
+                "Start": ":".join(match.group(3, 4, 5)),
+                "Data": pd.read_csv(os.path.join(folder, file)),
+            })
+    return pd.DataFrame(rows, columns=["Pilot", "Block", "Maneuver", "Start", "Data"])
+
+
+if __name__ == "__main__":
+
+    #slicecontroldata and the batch run write Block{X}_workload.csv already, this redoes it from the segment CSVs
+    block = sys.argv[1] if len(sys.argv) > 1 else "A"
+    reportPath = r"C:\Users\gmorfitt\Documents\Marshall Data Analysis\Reports"
+    segments = load_segments(reportPath, block)
+    print(f"Loaded {len(segments)} Block {block} segments")
+
+    workload = block_workload(segments)
+    workload.to_csv(os.path.join(reportPath, f"Block{block}_workload.csv"), index = False)
+    print(workload.groupby(["Maneuver", "Axis"])["Cutoff frequency (Hz)"].mean())
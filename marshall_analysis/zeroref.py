@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""
+Neutral cyclic reference (auto-zero) for the string-pot control data.
+
+The reference used to be the second sample of each column, so one noisy
+sample shifted every converted angle. Here it is the median over the
+quietest part of the ground/idle time before the first maneuver, with a
+linear drift taken from the idle time after the last maneuver. It is
+worked out once per session and stored in a session metadata file, later
+conversions read it back. The reference is stored with the preprocessing
+(repair, filters) and a hash of the data it came from, and is estimated
+again when either no longer matches, so every script converting a session
+has to pass the same prepared frame (slicing.prepare_control).
+
+@author: gmorfitt
+"""
+
+import os
+import json
+import hashlib
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .quality import CONTROL_HZ
+
+ZERO_AXES = ["Pitch", "Roll"]
+IDLE_WINDOW_S = 2     # length of the quiet window the median is taken over
+FALLBACK_IDLE_S = 10  # used when the log has no maneuvers before/after the data
+
+
+def quietest_window(values, length):
+    """
+    Returns a slice over the window of `length` samples with the least
+    movement (summed rolling std over all columns).
+    """
+    n = len(values)
+    if n <= length:
+        return slice(0, n)
+    movement = pd.DataFrame(values).rolling(length).std().sum(axis=1, min_count=1).to_numpy()[length - 1:]
+    if np.isnan(movement).all(): #no complete window anywhere, nanargmin would raise
+        return slice(0, length)
+    end = int(np.nanargmin(movement)) + length
+    return slice(end - length, end)
+
+
+def idle_bounds(control_times, maneuver_table, hz=CONTROL_HZ):
+    """
+    Sample ranges before the first and after the last logged maneuver.
+
+    Parameters
+    ----------
+    control_times : Series
+        control 'Time' column
+    maneuver_table : DataFrame or None
+        output of get_active_maneuvers
+
+    Returns
+    -------
+    pre, post : slice
+        idle sample ranges, post is None when there is nothing after the last maneuver
+
+    """
+    n = len(control_times)
+    fallback = min(n, FALLBACK_IDLE_S * hz)
+    if maneuver_table is None or len(maneuver_table) == 0:
+        return slice(0, fallback), None
+
+    times = control_times.astype(str).str.slice(0, 8).to_numpy()
+    log_times = maneuver_table["Time"].astype(str).str.zfill(8)
+    first = np.searchsorted(times, log_times.min(), side="left")
+    last = np.searchsorted(times, log_times.max(), side="right")
+
+    min_len = IDLE_WINDOW_S * hz
+    pre = slice(0, first) if first >= min_len else slice(0, fallback)
+    post = slice(last, n) if n - last >= min_len else None
+    return pre, post
+
+
+def estimate_zero(df_control, maneuver_table=None, axes=ZERO_AXES, hz=CONTROL_HZ):
+    """
+    Parameters
+    ----------
+    df_control : DataFrame
+        control data for a whole session (voltages)
+    maneuver_table : DataFrame or None
+        output of get_active_maneuvers, marks where the idle time ends
+
+    Returns
+    -------
+    zeros : dict
+        per axis {"zero": V at ref_index, "drift": V per sample, "ref_index": INT}.
+        An axis with no valid samples at all is left out
+
+    """
+    axes = [a for a in axes if a in df_control.columns]
+    values = df_control[axes].to_numpy(dtype=float)
+    length = IDLE_WINDOW_S * hz
+    pre, post = idle_bounds(df_control["Time"], maneuver_table, hz)
+
+    pre_win = quietest_window(values[pre], length)
+    pre_win = slice(pre.start + pre_win.start, pre.start + pre_win.stop)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning) #all-NaN windows are handled below
+        pre_zero = np.nanmedian(values[pre_win], axis=0)
+        # idle window all missing: fall back to the session median rather than storing NaN
+        missing = np.isnan(pre_zero)
+        if missing.any() and len(values):
+            pre_zero[missing] = np.nanmedian(values[:, missing], axis=0)
+    pre_mid = (pre_win.start + pre_win.stop) // 2
+
+    drift = np.zeros(len(axes))
+    if post is not None:
+        post_win = quietest_window(values[post], length)
+        post_win = slice(post.start + post_win.start, post.start + post_win.stop)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            post_zero = np.nanmedian(values[post_win], axis=0)
+        post_mid = (post_win.start + post_win.stop) // 2
+        if post_mid > pre_mid:
+            drift = (post_zero - pre_zero) / (post_mid - pre_mid)
+
+    ref_index = int(df_control.index[pre_mid]) if len(df_control) else 0
+    return {
+        axis: {"zero": float(z), "drift": float(d), "ref_index": ref_index}
+        for axis, z, d in zip(axes, pre_zero, np.nan_to_num(drift))
+        if np.isfinite(z)
+    }
+
+
+def data_hash(df_control, axes=ZERO_AXES):
+    """
+    Hash of the samples a zero reference is estimated from.
+    """
+    axes = [a for a in axes if a in df_control.columns]
+    values = np.ascontiguousarray(df_control[axes].to_numpy(dtype=float))
+    return hashlib.sha1(values.tobytes() + json.dumps(axes).encode()).hexdigest()
+
+
+def zero_source(df_control, preprocessing=None):
+    """
+    What a zero reference was estimated from, stored with it and compared on load.
+    """
+    return {"preprocessing": preprocessing, "data_hash": data_hash(df_control)}
+
+
+def load_session_zero(meta_path, session, source=None):
+    """
+    Stored zero reference for a session, or None if there isn't one yet or
+    it was estimated from different data/preprocessing than source.
+    """
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        meta = json.load(f)
+    stored = meta.get(session, {})
+    if source is not None and stored.get("zero_source") != source:
+        return None
+    return stored.get("zero_reference")
+
+
+def save_session_zero(meta_path, session, zeros, source=None):
+    """
+    Stores the zero reference and what it was estimated from in the session
+    metadata file, other sessions are kept.
+    """
+    meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+    meta.setdefault(session, {})["zero_reference"] = zeros
+    meta[session]["zero_source"] = source
+    folder = os.path.dirname(meta_path)
+    if folder:
+        os.makedirs(folder, exist_ok=True)
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def session_zero(df_control, meta_path, session, maneuver_table=None, hz=CONTROL_HZ, preprocessing=None):
+    """
+    Zero reference for a session: read from the metadata file if it was
+    worked out before from the same data, otherwise estimated and stored.
+
+    Parameters
+    ----------
+    df_control : DataFrame
+        prepared control data (voltages), see slicing.prepare_control
+    preprocessing : dict, optional
+        what was done to df_control, stored with the reference
+
+    """
+    source = zero_source(df_control, preprocessing)
+    zeros = load_session_zero(meta_path, session, source)
+    if zeros is None:
+        zeros = estimate_zero(df_control, maneuver_table, hz=hz)
+        missing = [a for a in ZERO_AXES if a in df_control.columns and a not in zeros]
+        if missing:
+            # not stored, so the next run tries again instead of reusing a bad reference
+            print(f"No zero reference for {', '.join(missing)} in {session}, no valid samples")
+        else:
+            save_session_zero(meta_path, session, zeros, source)
+            print(f"Stored zero reference for {session}")
+    return zeros
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Gap checks for maneuver segments (quality.find_gaps / segment_ok).
+
+@author: gmorfitt
+"""
+
+import numpy as np
+import pandas as pd
+
+from marshall_analysis import quality
+
+
+def control_with_gap(gap_from, gap_to, start="09:50:00", secs=60):
+    """
+    50 Hz control data from start, with the samples in [gap_from, gap_to) removed.
+    """
+    times = pd.date_range(f"2025-07-28 {start}", periods=secs * quality.CONTROL_HZ, freq="20ms")
+    df = pd.DataFrame({"Time": times.strftime("%H:%M:%S.%f").str[:-3],
+                       **{axis: np.full(len(times), 5.0) for axis in quality.CONTROL_AXES}})
+    clock = quality.clock_seconds(df["Time"])
+    missing = (clock >= quality.clock_seconds([gap_from])[0]) & (clock < quality.clock_seconds([gap_to])[0])
+    return df[~missing].reset_index(drop=True)
+
+
+def interval(start, stop):
+    return quality.clock_seconds([start])[0], quality.clock_seconds([stop])[0]
+
+
+def test_gap_at_segment_start_is_counted():
+    gaps = quality.find_gaps(control_with_gap("09:50:30", "09:50:32"))
+    assert not quality.segment_ok(gaps, *interval("09:50:30", "09:50:45"))
+
+
+def test_gap_at_segment_stop_is_counted():
+    gaps = quality.find_gaps(control_with_gap("09:50:44", "09:50:46"))
+    assert not quality.segment_ok(gaps, *interval("09:50:30", "09:50:45"))
+
+
+def test_gap_outside_segment_is_ignored():
+    gaps = quality.find_gaps(control_with_gap("09:50:10", "09:50:12"))
+    assert quality.segment_ok(gaps, *interval("09:50:30", "09:50:45"))